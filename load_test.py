@@ -0,0 +1,230 @@
+"""Load test for streamlit_app.py with concurrent headless sessions.
+
+Uses Streamlit's AppTest, so no server or network is needed. AppTest is not
+thread-safe (every run creates and tears down the process-wide Runtime), so each
+simulated session runs in its own freshly spawned process and keeps changing
+sidebar inputs the way employees do during an ERE information session. At most
+`--workers` sessions (default: one per CPU) run at the same time; the rest wait
+in a queue.
+
+Limitation: this measures N independent single-user apps, not one Streamlit
+server with N users. Every session has its own interpreter, Runtime and
+st.cache_data cache and does not compete for a shared GIL, so cache hits across
+users and GIL contention are not measured, and each process costs the
+interpreter plus Streamlit (about 185 MiB RSS) on top of the session itself.
+
+    $ python load_test.py --sessions 20 --reruns 10 --workers 4
+"""
+import argparse
+import gc
+import multiprocessing
+import os
+import random
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+from streamlit.testing.v1 import AppTest
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+APP_PATH = str(Path(__file__).with_name("streamlit_app.py"))
+
+
+def change_salary(at, rng):
+    widget = at.number_input(key='annual_salary')
+    widget.set_value(max(0.0, widget.value + rng.choice([-1, 1]) * rng.choice([1000.0, 2000.0, 5000.0])))
+
+
+def change_exit_date(at, rng):
+    widget = at.date_input(key='exit_date')
+    new_date = widget.value + relativedelta(months=rng.randint(-12, 12))
+    widget.set_value(min(max(new_date, date(2000, 1, 1)), date(2050, 12, 31)))
+
+
+def change_pension(at, rng):
+    widget = at.number_input(key=rng.choice(['retirement_salary_63', 'retirement_salary_65']))
+    widget.set_value(max(0.0, widget.value + rng.choice([-1, 1]) * rng.choice([50.0, 100.0, 250.0])))
+
+
+def change_retirement_age(at, rng):
+    widget = at.radio(key='retirement_age')
+    widget.set_value(widget.options[1] if widget.value == widget.options[0] else widget.options[0])
+
+
+def change_irpf(at, rng):
+    key, step = rng.choice([('irpf_tasa', 0.25), ('irpf_sepe', 0.5), ('irpf_jubilacion', 0.5)])
+    widget = at.number_input(key=key)
+    widget.set_value(min(max(widget.value + rng.choice([-1, 1]) * step, 0.0), 100.0))
+
+
+def change_sepe(at, rng):
+    widget = at.number_input(key='sepe_salary')
+    widget.set_value(max(0.0, widget.value + rng.choice([-1, 1]) * 100.0))
+
+
+def change_birth_date(at, rng):
+    widget = at.date_input(key='birth_date')
+    widget.set_value(widget.value + relativedelta(months=rng.randint(-24, 24)))
+
+
+# Acciones y pesos aproximados de lo que cambian los empleados en la barra lateral
+ACTIONS = [
+    (change_salary, 30),
+    (change_exit_date, 25),
+    (change_pension, 15),
+    (change_retirement_age, 10),
+    (change_irpf, 10),
+    (change_sepe, 5),
+    (change_birth_date, 5),
+]
+
+
+def peak_rss_mib():
+    """Peak resident memory of the current process in MiB, or None where unavailable"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss está en bytes en macOS y en KiB en Linux
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def timed_run(at):
+    """Rerun the app and return (latency in seconds, errors)"""
+    start = time.perf_counter()
+    try:
+        at.run()
+    except Exception:
+        return time.perf_counter() - start, 1
+    latency = time.perf_counter() - start
+    # Un árbol vacío significa que el script no llegó a ejecutarse
+    return latency, len(at.exception) + len(at.error) + (len(at.sidebar) == 0)
+
+
+def run_session(session_id, reruns, think_time, ramp_up, seed, timeout, test_started):
+    """Simulate one browser session in this process and return its measurements"""
+    rng = random.Random(seed + session_id)
+    actions, weights = zip(*ACTIONS)
+    latencies = []
+    errors = 0
+    rss_before = peak_rss_mib()
+
+    # Escalonar la llegada de los usuarios; las sesiones que esperaron en la cola no esperan más
+    time.sleep(max(test_started + rng.uniform(0, ramp_up) - time.time(), 0))
+    started = time.time()
+
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    latency, run_errors = timed_run(at)
+    latencies.append(latency)
+    errors += run_errors
+
+    for _ in range(reruns):
+        time.sleep(rng.uniform(0, think_time))
+        try:
+            rng.choices(actions, weights)[0](at, rng)
+        except Exception:
+            # El widget no existe si la ejecución anterior falló
+            errors += 1
+            continue
+        latency, run_errors = timed_run(at)
+        latencies.append(latency)
+        errors += run_errors
+
+    rss_after = peak_rss_mib()
+    return {
+        'latencies': latencies,
+        'errors': errors,
+        'started': started,
+        'finished': time.time(),
+        'rss': rss_after,
+        'rss_delta': None if rss_after is None else rss_after - rss_before
+    }
+
+
+def measure_session_memory(reruns, seed, timeout):
+    """Return (retained, peak) bytes allocated by a single session running alone"""
+    rng = random.Random(seed)
+    actions, weights = zip(*ACTIONS)
+
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout).run()
+    for _ in range(reruns):
+        rng.choices(actions, weights)[0](at, rng)
+        at.run()
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del at
+    return retained - baseline, peak - baseline
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test streamlit_app.py with concurrent headless sessions")
+    parser.add_argument('--sessions', type=int, default=10, help="Number of sessions")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Sessions running at the same time (default: CPU count)")
+    parser.add_argument('--reruns', type=int, default=10, help="Sidebar changes per session")
+    parser.add_argument('--think-time', type=float, default=1.0, help="Maximum pause between changes (s)")
+    parser.add_argument('--ramp-up', type=float, default=5.0, help="Window over which sessions start (s)")
+    parser.add_argument('--timeout', type=float, default=120.0, help="Timeout for a single rerun (s)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    workers = max(min(args.workers, args.sessions), 1)
+    print(f"Sesiones: {args.sessions} (un proceso cada una, {workers} a la vez), cambios por sesión: {args.reruns}")
+    print("Limitación: cada sesión es una app independiente de un solo usuario con su propio intérprete, "
+          "Runtime y caché; no se mide la caché compartida ni la contención del GIL de un servidor real")
+    # Un proceso nuevo por sesión para que no compartan el Runtime de Streamlit
+    context = multiprocessing.get_context('spawn')
+    test_started = time.time()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, max_tasks_per_child=1) as executor:
+        futures = [
+            executor.submit(run_session, session_id, args.reruns, args.think_time, args.ramp_up, args.seed, args.timeout, test_started)
+            for session_id in range(args.sessions)
+        ]
+        results = []
+        failed_sessions = 0
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                failed_sessions += 1
+                print(f"Sesión fallida: {e!r}")
+
+    if not results:
+        print("Ninguna sesión terminó")
+        return
+
+    # Rendimiento medido desde que llega el primer usuario hasta que termina el último
+    elapsed = max(r['finished'] for r in results) - min(r['started'] for r in results)
+    latencies = np.array([latency for r in results for latency in r['latencies']]) * 1000
+    errors = sum(r['errors'] for r in results)
+    p50, p90, p95, p99 = np.percentile(latencies, [50, 90, 95, 99])
+
+    print(f"Ejecuciones: {len(latencies)} en {elapsed:.1f} s ({len(latencies) / elapsed:.2f} ejecuciones/s)")
+    print(f"Latencia (ms): p50={p50:.0f} p90={p90:.0f} p95={p95:.0f} p99={p99:.0f} max={latencies.max():.0f}")
+    print(f"Errores: {errors}, sesiones fallidas: {failed_sessions}")
+
+    # Memoria: RSS máximo de cada proceso de sesión y una sesión medida en solitario con tracemalloc
+    if results[0]['rss'] is None:
+        print("RSS por proceso: no disponible en esta plataforma")
+    else:
+        rss = np.array([r['rss'] for r in results])
+        rss_delta = np.array([r['rss_delta'] for r in results])
+        print(f"RSS máximo por proceso (MiB, incluye intérprete y Streamlit): p50={np.median(rss):.0f} max={rss.max():.0f}")
+        print(f"Crecimiento del RSS del proceso durante la sesión (MiB, sobrecarga del proceso, "
+              f"no memoria de la app por sesión): p50={np.median(rss_delta):.1f} max={rss_delta.max():.1f}")
+    retained, peak = measure_session_memory(args.reruns, args.seed, args.timeout)
+    print(f"Memoria Python por sesión (MiB, tracemalloc): {retained / 2**20:.1f} retenida, {peak / 2**20:.1f} pico")
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,12 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
+import plotly.graph_objects as go
 from datetime import datetime, date
 from dateutil.relativedelta import relativedelta
 from io import BytesIO
+import hashlib
 import locale
 
 # Configurar la localización en español
@@ -119,7 +122,60 @@ def calculate_mixed_compensation(employment_start_date, exit_date, annual_salary
 
     return round(total_compensation, 2), round(period1_compensation, 2), round(period2_compensation, 2), limitation_applied
 
-def calculate_salary_evolution(birth_date, exit_date, annual_salary, fiscal_exemption, irpf_tasa, sepe_salary, irpf_sepe, retirement_salary_63, retirement_salary_65, irpf_jubilacion):
+def _round_array(values, decimals=2):
+    """np.round that matches Python's round() on near-halfway values"""
+    values = np.asarray(values, dtype=float)
+    rounded = np.array(np.round(values, decimals))
+    # np.round escala por 10**decimals y puede desviarse de round() cerca de la mitad
+    scaled = values * 10 ** decimals
+    halfway = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if halfway.any():
+        rounded[halfway] = [round(float(value), decimals) for value in values[halfway]]
+    return rounded
+
+def calculate_mixed_compensation_array(employment_start_dates, exit_dates, annual_salaries):
+    """Vectorized calculate_mixed_compensation over columns of start dates, exit dates and salaries"""
+    key_date = np.datetime64(date(2012, 2, 11), 'D')
+
+    employment_start_dates = np.asarray(employment_start_dates, dtype='datetime64[D]')
+    exit_dates = np.asarray(exit_dates, dtype='datetime64[D]')
+    annual_salaries = np.asarray(annual_salaries, dtype=float)
+
+    daily_salary = annual_salaries / 365
+
+    # Periodo 1: Desde incorporación hasta 12/02/2012 (45 días/año)
+    period1_days = (np.minimum(key_date, exit_dates) - employment_start_dates).astype(int)
+    period1_years = np.maximum(period1_days, 0) / 365
+
+    # Periodo 2: Desde 13/02/2012 hasta fecha de salida (33 días/año)
+    period2_days = (exit_dates - np.maximum(key_date, employment_start_dates)).astype(int)
+    period2_years = np.maximum(period2_days, 0) / 365
+
+    period1_compensation_days = period1_years * 45
+    period2_compensation_days = period2_years * 33
+
+    # Calcular indemnización para cada periodo
+    period1_compensation = period1_compensation_days * daily_salary
+    period2_compensation = period2_compensation_days * daily_salary
+
+    # Aplicar límites
+    period1_limited = period1_compensation_days >= 730
+    total_limited = (period1_compensation_days + period2_compensation_days) >= 730
+    total_compensation = np.where(
+        period1_limited,
+        730 * daily_salary,
+        np.where(
+            total_limited,
+            period1_compensation + (730 - period1_compensation_days) * daily_salary,
+            period1_compensation + period2_compensation
+        )
+    )
+    limitation_applied = period1_limited | total_limited
+
+    return _round_array(total_compensation), _round_array(period1_compensation), _round_array(period2_compensation), limitation_applied
+
+def _base_schedule(birth_date, exit_date, annual_salary, fiscal_exemption, irpf_tasa, sepe_salary, irpf_sepe):
+    """Compute the pension-independent part of the monthly schedule (SEPE, TESA and exemption)"""
     # Convertir porcentajes a decimales
     irpf_tasa = irpf_tasa / 100
     irpf_sepe = irpf_sepe / 100
@@ -136,15 +192,11 @@ def calculate_salary_evolution(birth_date, exit_date, annual_salary, fiscal_exem
     tesa_net_list = []
     sepe_gross_list = []
     sepe_net_list = []
-    pension_gross_list = []
-    pension_net_list = []
-    total_net_list = []
+    net_before_pension_list = []
     irpf_tasa_list = []
     irpf_sepe_rate_list = []
-    irpf_pension_rate_list = []
     irpf_tesa_applied_list = []
     irpf_sepe_applied_list = []
-    irpf_pension_applied_list = []
     accumulated_taxable_income_list = []
     
     current_date = exit_date
@@ -199,37 +251,17 @@ def calculate_salary_evolution(birth_date, exit_date, annual_salary, fiscal_exem
         
         tesa_net = tesa_gross - tesa_irpf
         
-        # 4. Calcular pensión bruta y neta
-        if current_date >= date_63:
-            pension_gross = retirement_salary_63 if retirement_salary_63 > 0 else retirement_salary_65
-            # Duplicar la pensión en junio (6) y noviembre (11)
-            if current_date.month in [6, 11]:
-                pension_gross *= 2
-            pension_irpf = pension_gross * (irpf_jubilacion / 100)
-            pension_net = pension_gross - pension_irpf
-        else:
-            pension_gross = 0
-            pension_irpf = 0
-            pension_net = 0
-        
-        # 5. Calcular total neto
-        total_net = tesa_net + sepe_net + pension_net
-        
         # Añadir a las listas
         dates.append(current_date)
         tesa_gross_list.append(round(tesa_gross, 2))
         tesa_net_list.append(round(tesa_net, 2))
         sepe_gross_list.append(round(sepe_gross, 2))
         sepe_net_list.append(round(sepe_net, 2))
-        pension_gross_list.append(round(pension_gross, 2))
-        pension_net_list.append(round(pension_net, 2))
-        total_net_list.append(round(total_net, 2))
+        net_before_pension_list.append(tesa_net + sepe_net)  # Sin redondear, se suma a la pensión
         irpf_tesa_applied_list.append(round(tesa_irpf, 2))
         irpf_sepe_applied_list.append(round(sepe_irpf, 2))
-        irpf_pension_applied_list.append(round(pension_irpf, 2))
         irpf_tasa_list.append(irpf_tasa * 100)  # Convertir a porcentaje
         irpf_sepe_rate_list.append(irpf_sepe * 100)  # Convertir a porcentaje
-        irpf_pension_rate_list.append(irpf_jubilacion)  # Ya está en porcentaje
         accumulated_taxable_income_list.append(round(accumulated_taxable_income, 2))
         
     
@@ -237,8 +269,7 @@ def calculate_salary_evolution(birth_date, exit_date, annual_salary, fiscal_exem
         current_date = current_date + relativedelta(months=1)
         month_count += 1
     
-    # Crear DataFrame primero con las fechas originales
-    df = pd.DataFrame({
+    columns = {
         'Fecha': dates,
         'TESA Bruto': tesa_gross_list,
         'Acumulado Tributable': accumulated_taxable_income_list,
@@ -248,16 +279,96 @@ def calculate_salary_evolution(birth_date, exit_date, annual_salary, fiscal_exem
         'SEPE Bruto': sepe_gross_list,
         'Tasa IRPF SEPE (%)': irpf_sepe_rate_list,
         'IRPF SEPE': irpf_sepe_applied_list,
-        'SEPE Neto': sepe_net_list,
+        'SEPE Neto': sepe_net_list
+    }
+    return columns, net_before_pension_list, date_63
+
+def _pension_columns(dates, pension_start_date, net_before_pension_list, retirement_salary, irpf_jubilacion):
+    """Compute the pension and total net columns on top of a base schedule, paying the pension from pension_start_date"""
+    pension_gross_list = []
+    pension_net_list = []
+    total_net_list = []
+    irpf_pension_rate_list = []
+    irpf_pension_applied_list = []
+
+    for current_date, net_before_pension in zip(dates, net_before_pension_list):
+        # 4. Calcular pensión bruta y neta
+        if current_date >= pension_start_date:
+            pension_gross = retirement_salary
+            # Duplicar la pensión en junio (6) y noviembre (11)
+            if current_date.month in [6, 11]:
+                pension_gross *= 2
+            pension_irpf = pension_gross * (irpf_jubilacion / 100)
+            pension_net = pension_gross - pension_irpf
+        else:
+            pension_gross = 0
+            pension_irpf = 0
+            pension_net = 0
+        
+        # 5. Calcular total neto
+        total_net = net_before_pension + pension_net
+
+        pension_gross_list.append(round(pension_gross, 2))
+        pension_net_list.append(round(pension_net, 2))
+        total_net_list.append(round(total_net, 2))
+        irpf_pension_applied_list.append(round(pension_irpf, 2))
+        irpf_pension_rate_list.append(irpf_jubilacion)  # Ya está en porcentaje
+
+    return {
         'Pensión Bruta': pension_gross_list,
         'Tasa IRPF Pensión (%)': irpf_pension_rate_list,
         'IRPF Pensión': irpf_pension_applied_list,
         'Pensión Neta': pension_net_list,
         'Total Neto': total_net_list
+    }
+
+def _salary_schedule(birth_date, exit_date, annual_salary, fiscal_exemption, irpf_tasa, sepe_salary, irpf_sepe, retirement_salary_63, retirement_salary_65, irpf_jubilacion):
+    """Compute the monthly schedule as numeric columns, without any formatting"""
+    columns, net_before_pension_list, date_63 = _base_schedule(
+        birth_date, exit_date, annual_salary, fiscal_exemption, irpf_tasa, sepe_salary, irpf_sepe
+    )
+    # Con pensión a los 63 se cobra desde los 63; si no, la pensión a los 65 empieza a los 65
+    if retirement_salary_63 > 0:
+        retirement_salary, pension_start_date = retirement_salary_63, date_63
+    else:
+        retirement_salary, pension_start_date = retirement_salary_65, birth_date + relativedelta(years=65)
+    columns.update(_pension_columns(columns['Fecha'], pension_start_date, net_before_pension_list, retirement_salary, irpf_jubilacion))
+    return columns
+
+def calculate_retirement_comparison(birth_date, exit_date, annual_salary, fiscal_exemption, irpf_tasa, sepe_salary, irpf_sepe, retirement_salary_63, retirement_salary_65, irpf_jubilacion):
+    """Evaluate retirement at 63 and at 65 in one pass, sharing the pension-independent schedule
+
+    Each branch pays its pension from its own retirement date, so retiring at 65
+    has no pension between 63 and 65.
+    """
+    columns, net_before_pension_list, date_63 = _base_schedule(
+        birth_date, exit_date, annual_salary, fiscal_exemption, irpf_tasa, sepe_salary, irpf_sepe
+    )
+    date_65 = birth_date + relativedelta(years=65)
+    df_numeric_63 = pd.DataFrame({
+        **columns,
+        **_pension_columns(columns['Fecha'], date_63, net_before_pension_list, retirement_salary_63, irpf_jubilacion)
+    })
+    df_numeric_65 = pd.DataFrame({
+        **columns,
+        **_pension_columns(columns['Fecha'], date_65, net_before_pension_list, retirement_salary_65, irpf_jubilacion)
     })
+    return df_numeric_63, df_numeric_65
+
+def calculate_salary_evolution(birth_date, exit_date, annual_salary, fiscal_exemption, irpf_tasa, sepe_salary, irpf_sepe, retirement_salary_63, retirement_salary_65, irpf_jubilacion):
+    # Crear DataFrame primero con las fechas originales
+    df_numeric = pd.DataFrame(_salary_schedule(
+        birth_date, exit_date, annual_salary, fiscal_exemption, irpf_tasa, sepe_salary, irpf_sepe,
+        retirement_salary_63, retirement_salary_65, irpf_jubilacion
+    ))
     
-    # Guardar una copia del DataFrame con los valores numéricos para los cálculos
-    df_numeric = df.copy()
+    # Devolver tanto el DataFrame formateado como el numérico
+    return format_schedule(df_numeric, birth_date), df_numeric
+
+def format_schedule(df_numeric, birth_date):
+    """Format a numeric schedule for display"""
+    # Copiar para no modificar los valores numéricos usados en los cálculos
+    df = df_numeric.copy()
     
     # Formatear columnas monetarias a euros españoles solo para visualización
     monetary_columns = [
@@ -294,8 +405,529 @@ def calculate_salary_evolution(birth_date, exit_date, annual_salary, fiscal_exem
     # Agregar la columna Fecha formateada al final
     df['Fecha'] = formatted_dates.apply(lambda x: f"{x.year} {months_es[x.month]}")
     
-    # Devolver tanto el DataFrame formateado como el numérico
-    return df, df_numeric
+    return df
+
+def calculate_irpf_tasa_applied(employment_start_date, exit_date, irpf_tasa):
+    """Apply the 30% exemption ratio rule to the TESA IRPF rate (scalars or columns)"""
+    # Calcular ratio de exención 30%
+    end_date_2035 = np.datetime64(date(2035, 12, 31), 'D')
+    exit_dates = np.asarray(exit_date, dtype='datetime64[D]')
+    days_worked = (exit_dates - np.asarray(employment_start_date, dtype='datetime64[D]')).astype(int)
+    days_until_2035 = (end_date_2035 - exit_dates).astype(int)
+
+    # Asegurarse de que no haya división por cero y que los días sean positivos
+    positive_days = days_until_2035 > 0
+    exemption_ratio = np.where(positive_days, days_worked / np.where(positive_days, days_until_2035, 1), 0.0)
+
+    # Ajustar IRPF TESA si el ratio es menor a 2
+    irpf_tasa_applied = np.where(exemption_ratio < 2.0, 30.0, irpf_tasa)
+
+    results = (irpf_tasa_applied, exemption_ratio, days_worked, days_until_2035)
+    if all(np.ndim(result) == 0 for result in results):
+        return tuple(result.item() for result in results)
+    return results
+
+def evaluate_scenario(birth_date, employment_start_date, exit_date, annual_salary, irpf_tasa, sepe_salary, irpf_sepe, retirement_salary_63, retirement_salary_65, irpf_jubilacion):
+    """Return (total net, minimum monthly net) for a scenario without building any DataFrame"""
+    irpf_tasa_applied = calculate_irpf_tasa_applied(employment_start_date, exit_date, irpf_tasa)[0]
+    fiscal_exemption = calculate_mixed_compensation(employment_start_date, exit_date, annual_salary)[0]
+
+    total_net_list = _salary_schedule(
+        birth_date, exit_date, annual_salary, fiscal_exemption, irpf_tasa_applied, sepe_salary, irpf_sepe,
+        retirement_salary_63, retirement_salary_65, irpf_jubilacion
+    )['Total Neto']
+
+    if not total_net_list:
+        return 0.0, 0.0
+    return sum(total_net_list), min(total_net_list)
+
+def evaluate_exit_dates(birth_date, employment_start_date, exit_dates, annual_salary, irpf_tasa, sepe_salary, irpf_sepe, retirement_salary_63, retirement_salary_65, irpf_jubilacion):
+    """Vectorized `evaluate_scenario` over many exit dates: returns (total net, minimum monthly net) arrays"""
+    exit_dates = np.asarray(exit_dates, dtype='datetime64[D]')
+    irpf_tasa_applied = calculate_irpf_tasa_applied(employment_start_date, exit_dates, irpf_tasa)[0]
+    fiscal_exemptions = calculate_mixed_compensation_array(employment_start_date, exit_dates, annual_salary)[0]
+
+    # Con pensión a los 63 se cobra desde los 63; si no, la pensión a los 65 empieza a los 65
+    if retirement_salary_63 > 0:
+        retirement_salary, pension_start_age = retirement_salary_63, 63
+    else:
+        retirement_salary, pension_start_age = retirement_salary_65, 65
+    monthly, totals = project_income_arrays(
+        birth_date, exit_dates, annual_salary, fiscal_exemptions, irpf_tasa_applied, sepe_salary, irpf_sepe,
+        retirement_salary, irpf_jubilacion, pension_start_ages=pension_start_age
+    )
+
+    # Sin meses calculados el escenario vale 0, como en evaluate_scenario
+    has_months = totals['Meses'] > 0
+    min_monthly = np.where(monthly['Válido'], monthly['Total Neto'], np.inf).min(axis=1, initial=np.inf)
+    return totals['Total Neto'], np.where(has_months, min_monthly, 0.0)
+
+def goal_seek(params, variable, target, lower, upper, metric='total', tolerance=0.01, max_evaluations=40):
+    """Find the value of `variable` between `lower` and `upper` at which the scenario reaches `target`.
+
+    `params` holds the keyword arguments of `evaluate_scenario`; `metric` is 'total' (total net)
+    or 'min_monthly' (minimum monthly net). Amounts are bisected, which assumes the metric grows
+    or shrinks monotonically with them; the value returned is the bound of the final interval
+    that reaches the target. For 'exit_date' the bounds are dates and the metric is not monotonic
+    (the 30% IRPF rule switches off once the exemption ratio reaches 2), so every whole month from
+    `lower` to `upper` is evaluated in one batch and the latest exit date reaching the target is
+    returned. Returns (value, achieved metric, evaluations), with value None when no value in the
+    range reaches the target (or, for amounts, the target is not bracketed by the bounds).
+    """
+    metric_index = 0 if metric == 'total' else 1
+
+    if variable == 'exit_date':
+        # Evaluar todos los meses del intervalo y quedarse con la última fecha que alcanza el objetivo
+        months = (upper.year - lower.year) * 12 + (upper.month - lower.month)
+        if months < 0:
+            return None, None, 0
+        exit_dates = _add_months_array(np.datetime64(lower, 'D'), np.arange(months + 1))
+        other_params = {key: value for key, value in params.items() if key != 'exit_date'}
+        values = evaluate_exit_dates(exit_dates=exit_dates, **other_params)[metric_index]
+        reached = np.flatnonzero(values >= target)
+        if len(reached) == 0:
+            return None, None, len(exit_dates)
+        return lower + relativedelta(months=int(reached[-1])), float(values[reached[-1]]), len(exit_dates)
+
+    evaluations = 0
+
+    def evaluate(x):
+        nonlocal evaluations
+        evaluations += 1
+        return evaluate_scenario(**{**params, variable: x})[metric_index]
+
+    lower_value = evaluate(lower)
+    upper_value = evaluate(upper)
+    lower_reached = lower_value >= target
+    if lower_reached == (upper_value >= target):
+        return None, None, evaluations
+
+    # Mantener siempre el objetivo entre los dos extremos del intervalo
+    while upper - lower > tolerance and evaluations < max_evaluations:
+        middle = (lower + upper) / 2
+        middle_value = evaluate(middle)
+        if (middle_value >= target) == lower_reached:
+            lower, lower_value = middle, middle_value
+        else:
+            upper, upper_value = middle, middle_value
+
+    # Devolver el extremo que alcanza el objetivo
+    if lower_reached:
+        return lower, lower_value, evaluations
+    return upper, upper_value, evaluations
+
+def _add_months_array(dates, months):
+    """Vectorized `date + relativedelta(months=months)` for datetime64[D] arrays"""
+    month_starts = dates.astype('datetime64[M]')
+    days = (dates - month_starts.astype('datetime64[D]')).astype(int)
+    target_months = month_starts + months
+    days_in_month = ((target_months + 1).astype('datetime64[D]') - target_months.astype('datetime64[D]')).astype(int)
+    return target_months.astype('datetime64[D]') + np.minimum(days, days_in_month - 1)
+
+def project_income_arrays(birth_dates, exit_dates, annual_salaries, fiscal_exemptions, irpf_tasa, sepe_salaries, irpf_sepe, retirement_salaries, irpf_jubilacion, horizon_age=65, pension_revaluation=0.0, discount_rate=0.0, pension_start_ages=63):
+    """Vectorized monthly projection for one or many employees up to `horizon_age`.
+
+    Every argument may be a scalar or a column (one value per employee); rates are
+    percentages. Pensions start at `pension_start_ages` (63 or 65 per employee) and
+    are revalued every January from that year by `pension_revaluation`; the net
+    income is discounted monthly at the annual `discount_rate`. With the defaults
+    it reproduces `_salary_schedule`. Returns (monthly, totals): dicts of
+    (employees, months) and (employees,) arrays.
+    """
+    birth_dates, exit_dates = (np.atleast_1d(np.asarray(x, dtype='datetime64[D]')) for x in (birth_dates, exit_dates))
+    birth_dates, exit_dates, annual_salaries, fiscal_exemptions, irpf_tasa, sepe_salaries, irpf_sepe, retirement_salaries, irpf_jubilacion, pension_start_ages = np.broadcast_arrays(
+        birth_dates, exit_dates, *(np.atleast_1d(np.asarray(x, dtype=float)) for x in (
+            annual_salaries, fiscal_exemptions, irpf_tasa, sepe_salaries, irpf_sepe, retirement_salaries, irpf_jubilacion, pension_start_ages
+        ))
+    )
+
+    # Convertir porcentajes a decimales
+    irpf_tasa = irpf_tasa[:, None] / 100
+    irpf_sepe = irpf_sepe[:, None] / 100
+
+    # Calcular fechas importantes
+    date_63 = _add_months_array(birth_dates, 63 * 12)[:, None]
+    date_65 = _add_months_array(birth_dates, 65 * 12)[:, None]
+    end_date = _add_months_array(birth_dates, int(horizon_age * 12))[:, None]
+    pension_start = _add_months_array(birth_dates, np.rint(pension_start_ages * 12).astype(int))[:, None]
+
+    # Rejilla de meses: el día se recorta igual que al sumar relativedelta(months=1) mes a mes
+    exit_months = exit_dates.astype('datetime64[M]')
+    month_count = max(int((end_date[:, 0].astype('datetime64[M]') - exit_months).astype(int).max()) + 1, 0)
+    month_index = np.arange(month_count)
+    grid_months = exit_months.astype(int)[:, None] + month_index
+    # Días de cada mes calculados una sola vez para el rango de meses de la rejilla
+    first_month = grid_months.min(initial=0)
+    month_range = np.arange(first_month, grid_months.max(initial=0) + 1).astype('datetime64[M]')
+    month_lengths = ((month_range + 1).astype('datetime64[D]') - month_range.astype('datetime64[D]')).astype(int)
+    exit_days = (exit_dates - exit_months.astype('datetime64[D]')).astype(int)[:, None] + 1
+    days_in_month = np.where(month_index == 0, exit_days, month_lengths[grid_months - first_month])
+    days = np.minimum(np.minimum.accumulate(days_in_month, axis=1), exit_days)
+    dates = grid_months.astype('datetime64[M]').astype('datetime64[D]') + (days - 1)
+    valid = dates <= end_date
+
+    current_year = grid_months // 12 + 1970
+    current_month = grid_months % 12 + 1
+    exit_year = exit_months.astype(int)[:, None] // 12 + 1970
+    exit_month = exit_months.astype(int)[:, None] % 12 + 1
+
+    # 1. Calcular salario SEPE (solo primeros 24 meses)
+    sepe_gross = np.where((month_index < 24) & valid, sepe_salaries[:, None], 0.0)
+    sepe_irpf = sepe_gross * irpf_sepe
+    sepe_net = sepe_gross - sepe_irpf
+
+    # 2. Calcular salario TESA bruto (incremento del 1% anual hasta 2033)
+    max_year = 2033
+    years_since_start = (current_year - exit_year) + (current_month - exit_month) / 12
+    increment_factor = np.where(
+        current_year <= max_year,
+        1.01 ** np.minimum(years_since_start, max_year - exit_year),
+        1.01 ** (max_year - exit_year)
+    )
+    annual_salaries = annual_salaries[:, None]
+    tesa_gross = np.where(
+        dates < date_63,
+        (annual_salaries * 0.68) / 12 - sepe_gross,
+        np.where(dates < date_65, (annual_salaries * 0.38 * increment_factor) / 12 - sepe_gross, 0.0)
+    )
+    tesa_gross = np.where(valid, tesa_gross, 0.0)
+
+    # 3. Calcular IRPF TESA (solo después de alcanzar la exención fiscal)
+    accumulated_taxable_income = np.cumsum(tesa_gross, axis=1)
+    exemption_reached = np.logical_or.accumulate(accumulated_taxable_income >= fiscal_exemptions[:, None], axis=1)
+    first_reached = exemption_reached & ~np.pad(exemption_reached, ((0, 0), (1, 0)))[:, :-1]
+    tesa_irpf = np.where(
+        first_reached,
+        (accumulated_taxable_income - fiscal_exemptions[:, None]) * irpf_tasa,
+        np.where(exemption_reached, tesa_gross * irpf_tasa, 0.0)
+    )
+    tesa_net = tesa_gross - tesa_irpf
+
+    # 4. Calcular pensión bruta y neta, revalorizada cada enero desde el año en que empieza
+    pension_start_year = pension_start.astype('datetime64[Y]').astype(int) + 1970
+    revaluation_factor = (1 + pension_revaluation / 100) ** np.maximum(current_year - pension_start_year, 0)
+    pension_gross = np.where((dates >= pension_start) & valid, retirement_salaries[:, None] * revaluation_factor, 0.0)
+    # Duplicar la pensión en junio (6) y noviembre (11)
+    pension_gross = np.where((current_month == 6) | (current_month == 11), pension_gross * 2, pension_gross)
+    pension_irpf = pension_gross * (irpf_jubilacion[:, None] / 100)
+    pension_net = pension_gross - pension_irpf
+
+    # 5. Calcular total neto y su valor actual
+    total_net = tesa_net + sepe_net + pension_net
+    discount_factor = (1 + discount_rate / 100) ** (-month_index / 12)
+
+    monthly = {
+        'Fecha': dates,
+        'Válido': valid,
+        'TESA Bruto': _round_array(tesa_gross),
+        'Acumulado Tributable': _round_array(accumulated_taxable_income),
+        'IRPF TESA': _round_array(tesa_irpf),
+        'TESA Neto': _round_array(tesa_net),
+        'SEPE Bruto': _round_array(sepe_gross),
+        'IRPF SEPE': _round_array(sepe_irpf),
+        'SEPE Neto': _round_array(sepe_net),
+        'Pensión Bruta': _round_array(pension_gross),
+        'IRPF Pensión': _round_array(pension_irpf),
+        'Pensión Neta': _round_array(pension_net),
+        'Total Neto': _round_array(total_net)
+    }
+    totals = {
+        'Meses': valid.sum(axis=1),
+        'Total TESA Neto': monthly['TESA Neto'].sum(axis=1),
+        'Total SEPE Neto': monthly['SEPE Neto'].sum(axis=1),
+        'Total Pensión Neta': monthly['Pensión Neta'].sum(axis=1),
+        'Total Neto': monthly['Total Neto'].sum(axis=1),
+        'Valor Actual Neto': (monthly['Total Neto'] * discount_factor).sum(axis=1)
+    }
+    return monthly, totals
+
+# Parámetros del análisis de sensibilidad: (nombre, unidad, variación usada en el gráfico)
+SENSITIVITY_PARAMETERS = [
+    ('Salario Anual Bruto', '€/año', 1000.0),
+    ('Fecha de Salida', 'mes', 1),
+    ('IRPF TESA', 'punto %', 1.0),
+    ('IRPF SEPE', 'punto %', 1.0),
+    ('IRPF Pensión', 'punto %', 1.0),
+    ('Salario SEPE', '€/mes', 100.0),
+    ('Pensión mensual', '€/mes', 100.0),
+]
+
+def calculate_sensitivity(birth_date, employment_start_date, exit_date, annual_salary, irpf_tasa, sepe_salary, irpf_sepe, retirement_salary, irpf_jubilacion, pension_start_age=63):
+    """Sensitivity of total net and fiscal exemption to every input, in one batched evaluation.
+
+    Each parameter is moved down (not below zero) and up by its step in
+    SENSITIVITY_PARAMETERS, with IRPF rates kept at or below 100%; all the perturbed scenarios are stacked as rows of a
+    single `project_income_arrays` call. Returns a DataFrame with the change per
+    step and per unit of each parameter.
+    """
+    base = {
+        'Salario Anual Bruto': annual_salary, 'Fecha de Salida': 0, 'IRPF TESA': irpf_tasa,
+        'IRPF SEPE': irpf_sepe, 'IRPF Pensión': irpf_jubilacion, 'Salario SEPE': sepe_salary,
+        'Pensión mensual': retirement_salary
+    }
+
+    # Fila 0: escenario base; después, cada parámetro con -paso y +paso
+    scenarios = [base]
+    for name, _, step in SENSITIVITY_PARAMETERS:
+        # Los importes y tipos no pueden ser negativos ni los tipos superar el 100%; la fecha de salida se desplaza en meses
+        down = base[name] - step if name == 'Fecha de Salida' else max(base[name] - step, 0)
+        scenarios.append({**base, name: down})
+        up = min(base[name] + step, 100.0) if name in ('IRPF TESA', 'IRPF SEPE', 'IRPF Pensión') else base[name] + step
+        scenarios.append({**base, name: up})
+    columns = {name: np.array([scenario[name] for scenario in scenarios]) for name in base}
+
+    exit_dates = np.array([exit_date + relativedelta(months=int(months)) for months in columns['Fecha de Salida']], dtype='datetime64[D]')
+    fiscal_exemptions = calculate_mixed_compensation_array(employment_start_date, exit_dates, columns['Salario Anual Bruto'])[0]
+
+    irpf_tasa_applied = calculate_irpf_tasa_applied(employment_start_date, exit_dates, columns['IRPF TESA'])[0]
+
+    total_net = project_income_arrays(
+        birth_date, exit_dates, columns['Salario Anual Bruto'], fiscal_exemptions, irpf_tasa_applied,
+        columns['Salario SEPE'], columns['IRPF SEPE'], columns['Pensión mensual'], columns['IRPF Pensión'],
+        pension_start_ages=pension_start_age
+    )[1]['Total Neto']
+
+    rows = []
+    for index, (name, unit, step) in enumerate(SENSITIVITY_PARAMETERS):
+        down, up = 2 * index + 1, 2 * index + 2
+        span = columns[name][up] - columns[name][down]
+        rows.append({
+            'Parámetro': name,
+            'Unidad': unit,
+            'Paso': step,
+            'Total Neto (-paso)': total_net[down] - total_net[0],
+            'Total Neto (+paso)': total_net[up] - total_net[0],
+            'Total Neto por unidad': (total_net[up] - total_net[down]) / span,
+            'Exención Fiscal por unidad': (fiscal_exemptions[up] - fiscal_exemptions[down]) / span
+        })
+    return pd.DataFrame(rows)
+
+# Presupuesto total de puntos en gráficos de varias series, series con leyenda y umbral para usar WebGL
+MAX_OVERLAY_POINTS = 20000
+MAX_LEGEND_SERIES = 20
+WEBGL_POINT_THRESHOLD = 5000
+
+def array_hash(*arrays):
+    """Stable hash of numpy arrays, used as figure cache key"""
+    digest = hashlib.sha1()
+    for array in arrays:
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+def schedule_hash(df_numeric):
+    """Stable hash of a numeric schedule, used as figure cache key"""
+    return array_hash(pd.util.hash_pandas_object(df_numeric, index=False).values)
+
+def downsample_series(x, y, max_points=MAX_OVERLAY_POINTS):
+    """Min/max downsampling: keep the lowest and highest point of each bucket"""
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    if len(y) <= max_points:
+        return x, y
+
+    buckets = max(max_points // 2, 1)
+    bucket_size = -(-len(y) // buckets)
+    padded = np.pad(y, (0, buckets * bucket_size - len(y)), mode='edge').reshape(buckets, bucket_size)
+    offsets = np.arange(buckets) * bucket_size
+    keep = np.concatenate([offsets + padded.argmin(axis=1), offsets + padded.argmax(axis=1), [0, len(y) - 1]])
+    keep = np.unique(np.minimum(keep, len(y) - 1))
+    return x[keep], y[keep]
+
+def _render_mode(point_count, chart_rendering):
+    """Choose 'webgl' or 'svg' line rendering from the sidebar option"""
+    if chart_rendering == "WebGL":
+        return 'webgl'
+    if chart_rendering == "SVG":
+        return 'svg'
+    return 'webgl' if point_count > WEBGL_POINT_THRESHOLD else 'svg'
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def build_net_evolution_figure(schedule_key, _df_numeric, render_mode):
+    """Monthly net line chart, cached by `schedule_key`"""
+    # Crear una columna de fecha formateada para el gráfico
+    df_plot = _df_numeric[['Fecha', 'Total Neto']].copy()
+    
+    # Asegurarse de que la columna Fecha es de tipo datetime
+    if not pd.api.types.is_datetime64_any_dtype(df_plot['Fecha']):
+        df_plot['Fecha'] = pd.to_datetime(df_plot['Fecha'])
+        
+    # Crear columna de fecha formateada
+    df_plot['Mes'] = df_plot['Fecha'].dt.strftime('%b %Y')  # Formato abreviado mes y año
+    
+    fig = px.line(
+        df_plot,
+        x='Mes', 
+        y='Total Neto',
+        title='Evolución del Salario Neto Mensual',
+        labels={'Total Neto': 'Salario Neto (€)', 'Mes': 'Mes'},
+        range_y=[0, df_plot['Total Neto'].max() * 1.1],
+        render_mode=render_mode
+    )
+    
+    # Actualizar el formato de los ejes y añadir grid
+    fig.update_layout(
+        xaxis=dict(
+            showgrid=True,
+            gridwidth=1,
+            gridcolor='LightGrey',
+            tickangle=-45,
+            tickmode='auto',
+            nticks=min(len(df_plot), 36),  # Máximo 36 meses para evitar saturación
+            showline=True,
+            linewidth=1,
+            linecolor='black'
+        ),
+        yaxis=dict(
+            showgrid=True,
+            gridwidth=1,
+            gridcolor='LightGrey',
+            tickprefix='€',
+            tickformat=',.2f',
+            showline=True,
+            linewidth=1,
+            linecolor='black',
+            zeroline=True,
+            zerolinewidth=1,
+            zerolinecolor='Grey'
+        ),
+        plot_bgcolor='white',
+        hovermode='x unified'
+    )
+    return fig
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def build_annual_summary(schedule_key, _df_numeric):
+    """Yearly totals and stacked bar chart, cached by `schedule_key`"""
+    df_anual = _df_numeric[['Fecha', 'TESA Neto', 'SEPE Neto', 'Pensión Neta', 'Total Neto']].copy()
+    # Asegurarse de que la columna Fecha es de tipo datetime
+    if not pd.api.types.is_datetime64_any_dtype(df_anual['Fecha']):
+        df_anual['Fecha'] = pd.to_datetime(df_anual['Fecha'])
+    df_anual['Año'] = df_anual['Fecha'].dt.year
+    
+    # Agrupar por año y sumar las columnas relevantes
+    columnas_sumar = ['TESA Neto', 'SEPE Neto', 'Pensión Neta', 'Total Neto']
+    resumen_anual = df_anual.groupby('Año')[columnas_sumar].sum().reset_index()
+
+    # Preparar datos para el gráfico
+    df_anual_plot = resumen_anual.melt(
+        id_vars=['Año'],
+        value_vars=['TESA Neto', 'SEPE Neto', 'Pensión Neta'],
+        var_name='Concepto',
+        value_name='Importe'
+    )
+    
+    # Crear gráfico de barras apiladas
+    fig_anual = px.bar(
+        df_anual_plot,
+        x='Año',
+        y='Importe',
+        color='Concepto',
+        title='Distribución Anual por Concepto',
+        labels={'Año': 'Año', 'Importe': 'Importe (€)', 'Concepto': 'Concepto'},
+        barmode='stack'
+    )
+    
+    # Formatear ejes
+    fig_anual.update_yaxes(
+        tickprefix='€',
+        tickformat=',.2f',
+        title_text='Importe (€)'
+    )
+    return resumen_anual, fig_anual
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def overlay_plot_data(series_key, _series, max_points=MAX_OVERLAY_POINTS):
+    """Plot-ready arrays for an overlay of {name: (dates, values)}, cached by `series_key`.
+
+    At most `max_points` points are returned in total. A few series are kept as
+    separate lines, each downsampled to its share of the budget. Many series that
+    fit the budget are joined into one array separated by NaN gaps. Above the
+    budget they are aggregated into the 5/25/50/75/95 percentiles per month.
+    Returns (mode, data) with mode 'lines', 'joined' or 'band'.
+    """
+    series = {
+        name: (np.asarray(dates, dtype='datetime64[D]'), np.asarray(values, dtype=float))
+        for name, (dates, values) in _series.items()
+    }
+
+    if len(series) <= MAX_LEGEND_SERIES:
+        share = max(max_points // max(len(series), 1), 2)
+        return 'lines', {name: downsample_series(dates, values, share) for name, (dates, values) in series.items()}
+
+    # Las series vacías no aportan puntos; en el modo unido desalinearían fechas y valores
+    all_dates = [dates for dates, values in series.values() if len(values)]
+    all_values = [values for _, values in series.values() if len(values)]
+    if sum(len(values) + 1 for values in all_values) <= max_points:
+        # Una sola serie con huecos NaN entre empleados; Plotly serializa NaT como 1970-01-01,
+        # así que el hueco repite la última fecha de cada serie
+        gap_value = np.array([np.nan])
+        x = np.concatenate([part for dates in all_dates for part in (dates, dates[-1:])])
+        y = np.concatenate([part for values in all_values for part in (values, gap_value)])
+        return 'joined', (x, y)
+
+    # Percentiles por mes sobre la unión de meses de todas las series
+    months, positions = np.unique(np.concatenate(all_dates).astype('datetime64[M]'), return_inverse=True)
+    dates = months.astype('datetime64[D]')
+    matrix = np.full((len(all_values), len(months)), np.nan)
+    rows = np.repeat(np.arange(len(all_values)), [len(values) for values in all_values])
+    matrix[rows, positions] = np.concatenate(all_values)
+
+    # Interpolación lineal como np.percentile; ordenar una vez deja los NaN al final de cada columna
+    matrix.sort(axis=0)
+    counts = np.count_nonzero(~np.isnan(matrix), axis=0)
+    columns = np.arange(len(months))
+    positions = np.array([5, 25, 50, 75, 95])[:, None] / 100 * (counts - 1)
+    lower = np.floor(positions).astype(int)
+    upper = np.ceil(positions).astype(int)
+    percentiles = matrix[lower, columns] + (positions - lower) * (matrix[upper, columns] - matrix[lower, columns])
+
+    # Aclarar la rejilla si ni siquiera las cinco curvas caben en el presupuesto
+    if len(dates) * 5 > max_points:
+        keep = np.unique(np.linspace(0, len(dates) - 1, max_points // 5).astype(int))
+        dates, percentiles = dates[keep], percentiles[:, keep]
+    return 'band', (dates, percentiles)
+
+def build_overlay_figure(series_key, series, title, chart_rendering):
+    """Line chart overlaying many series ({name: (dates, values)}) from cached plot-ready arrays"""
+    mode, data = overlay_plot_data(series_key, series)
+
+    if mode == 'lines':
+        point_count = sum(len(values) for _, values in data.values())
+    elif mode == 'joined':
+        point_count = len(data[1])
+    else:
+        point_count = data[1].size
+    trace_type = go.Scattergl if _render_mode(point_count, chart_rendering) == 'webgl' else go.Scatter
+
+    if mode == 'lines':
+        traces = [trace_type(x=dates, y=values, mode='lines', name=name) for name, (dates, values) in data.items()]
+    elif mode == 'joined':
+        dates, values = data
+        traces = [trace_type(
+            x=dates, y=values, mode='lines', name=f"{len(series)} series",
+            line=dict(width=1), opacity=0.5, connectgaps=False
+        )]
+    else:
+        dates, (p5, p25, p50, p75, p95) = data
+        band = dict(mode='lines', line=dict(width=0), hoverinfo='skip', showlegend=False)
+        traces = [
+            go.Scatter(x=dates, y=p95, **band),
+            go.Scatter(x=dates, y=p5, fill='tonexty', fillcolor='rgba(99, 110, 250, 0.2)', name='Percentil 5-95', **{**band, 'showlegend': True}),
+            go.Scatter(x=dates, y=p75, **band),
+            go.Scatter(x=dates, y=p25, fill='tonexty', fillcolor='rgba(99, 110, 250, 0.4)', name='Percentil 25-75', **{**band, 'showlegend': True}),
+            go.Scatter(x=dates, y=p50, mode='lines', name=f"Mediana de {len(series)} series")
+        ]
+    fig = go.Figure(data=traces)
+
+    fig.update_layout(
+        title=title,
+        xaxis_title='Mes',
+        yaxis_title='Salario Neto (€)',
+        plot_bgcolor='white',
+        hovermode='closest' if mode == 'joined' else 'x unified'
+    )
+    fig.update_yaxes(tickprefix='€', tickformat=',.2f')
+    return fig
 
 def main():
     st.set_page_config(page_title="Calculadora ERE España", layout="wide")
@@ -444,27 +1076,21 @@ def main():
             key='retirement_age'
         )
         
-        # Mostrar el input correspondiente según la edad de jubilación seleccionada
-        if retirement_age == "Jubilación a los 63 años":
-            retirement_salary = st.number_input(
-                "Pensión mensual por jubilación (€/mes)",
-                min_value=0.0,
-                value=st.session_state.get('retirement_salary_63', 3771.25),
-                step=100.0,
-                key="retirement_salary_63"
-            )
-            # Establecer el otro valor a 0 para que no afecte los cálculos
-            retirement_salary_other = 0
-        else:
-            retirement_salary_other = st.number_input(
-                "Pensión mensual por jubilación (€/mes)",
-                min_value=0.0,
-                value=st.session_state.get('retirement_salary_65', 4328.67),
-                step=50.0,
-                key="retirement_salary_65"
-            )
-            # Establecer el otro valor a 0 para que no afecte los cálculos
-            retirement_salary = 0
+        # Mostrar ambas pensiones para poder comparar las dos edades de jubilación
+        retirement_salary = st.number_input(
+            "Pensión mensual jubilación a los 63 años (€/mes)",
+            min_value=0.0,
+            value=st.session_state.get('retirement_salary_63', 3771.25),
+            step=100.0,
+            key="retirement_salary_63"
+        )
+        retirement_salary_other = st.number_input(
+            "Pensión mensual jubilación a los 65 años (€/mes)",
+            min_value=0.0,
+            value=st.session_state.get('retirement_salary_65', 4328.67),
+            step=50.0,
+            key="retirement_salary_65"
+        )
         
         # IRPF Jubilación (por defecto: 23%)
         irpf_jubilacion = st.number_input(
@@ -475,29 +1101,62 @@ def main():
             step=0.5,
             key='irpf_jubilacion'
         )
+
+        # Proyección opcional más allá de los 65 años
+        st.subheader("Proyección a Largo Plazo")
+        long_horizon = st.checkbox(
+            "Proyectar más allá de los 65 años",
+            value=st.session_state.get('long_horizon', False),
+            key='long_horizon'
+        )
+        if long_horizon:
+            horizon_age = st.number_input(
+                "Edad final de la proyección",
+                min_value=65,
+                max_value=110,
+                value=st.session_state.get('horizon_age', 90),
+                step=1,
+                key='horizon_age'
+            )
+            pension_revaluation = st.number_input(
+                "Revalorización anual de la pensión (%)",
+                min_value=0.0,
+                max_value=20.0,
+                value=st.session_state.get('pension_revaluation', 2.0),
+                step=0.1,
+                key='pension_revaluation'
+            )
+            discount_rate = st.number_input(
+                "Tasa de descuento anual (%)",
+                min_value=0.0,
+                max_value=20.0,
+                value=st.session_state.get('discount_rate', 3.0),
+                step=0.1,
+                key='discount_rate'
+            )
+
+        # Renderizado de los gráficos de líneas
+        st.subheader("Gráficos")
+        chart_rendering = st.selectbox(
+            "Renderizado de gráficos",
+            ["Automático", "SVG", "WebGL"],
+            index=["Automático", "SVG", "WebGL"].index(st.session_state.get('chart_rendering', "Automático")),
+            help="WebGL es más rápido con muchos puntos; en automático se usa a partir de "
+                 f"{WEBGL_POINT_THRESHOLD:,} puntos".replace(',', '.'),
+            key='chart_rendering'
+        )
     
     try:
         # Pasar los parámetros de jubilación correctos según la selección
         retirement_salary_63 = retirement_salary if retirement_age == "Jubilación a los 63 años" else 0
         retirement_salary_65 = retirement_salary_other if retirement_age == "Jubilación a los 65 años" else 0
         
-        # Calcular ratio de exención 30%
+        # Calcular ratio de exención 30% y ajustar IRPF TESA si el ratio es menor a 2
         end_date_2035 = date(2035, 12, 31)
-        days_worked = (exit_date - employment_start_date).days
-        days_until_2035 = (end_date_2035 - exit_date).days
-        
-        # Asegurarse de que no haya división por cero y que los días sean positivos
-        if days_until_2035 > 0:
-            exemption_ratio = days_worked / days_until_2035
-        else:
-            exemption_ratio = 0
-        
-        # Ajustar IRPF TESA si el ratio es menor a 2
-        if exemption_ratio < 2.0:
-            irpf_tasa_applied = 30.0
-        else:
-            irpf_tasa_applied = irpf_tasa
-        
+        irpf_tasa_applied, exemption_ratio, days_worked, days_until_2035 = calculate_irpf_tasa_applied(
+            employment_start_date, exit_date, irpf_tasa
+        )
+
         # Calcular indemnización mixta primero para obtener mixed_comp_total
         mixed_comp_total, mixed_comp_period1, mixed_comp_period2, mixed_comp_limitation = calculate_mixed_compensation(
             employment_start_date, exit_date, annual_salary
@@ -506,12 +1165,14 @@ def main():
         # Crear variable fiscal_exemption igual a mixed_comp_total
         fiscal_exemption = mixed_comp_total
                 
-        # Calcular la evolución salarial (obtenemos ambos DataFrames)
-        df, df_numeric = calculate_salary_evolution(
+        # Calcular la evolución salarial de ambas edades de jubilación en una sola pasada
+        df_numeric_63, df_numeric_65 = calculate_retirement_comparison(
             birth_date, exit_date, annual_salary, 
             fiscal_exemption, irpf_tasa_applied, sepe_salary, irpf_sepe,
-            retirement_salary_63, retirement_salary_65, irpf_jubilacion
+            retirement_salary, retirement_salary_other, irpf_jubilacion
         )
+        df_numeric = df_numeric_63 if retirement_age == "Jubilación a los 63 años" else df_numeric_65
+        df = format_schedule(df_numeric, birth_date)
         
         # Calcular Fecha de salida objetivo (ratio >= 2)
         target_exit_date = None
@@ -556,6 +1217,100 @@ def main():
         with col4:
             st.metric("Total Neto", f"{total_net:,.2f} €".replace(',', 'X').replace('.', ',').replace('X', '.'), delta_color="off")
         
+        # Comparar jubilación a los 63 y a los 65 años (mismo calendario hasta los 63)
+        st.markdown('<h3 style="color:blue;">Comparativa Jubilación 63 vs 65 años</h3>', unsafe_allow_html=True)
+        st.caption(
+            "El calendario termina al cumplir los 65 años: la jubilación a los 65 no cobra pensión entre los 63 y los 65 "
+            "y como mucho cobra el último mes. Para comparar ambas pensiones más allá de los 65 activa la proyección a largo plazo."
+        )
+        date_63 = birth_date + relativedelta(years=63)
+        total_net_63 = df_numeric_63['Total Neto'].sum()
+        total_net_65 = df_numeric_65['Total Neto'].sum()
+        monthly_net_63 = df_numeric_63.loc[df_numeric_63['Fecha'] >= date_63, 'Total Neto'].mean()
+        monthly_net_65 = df_numeric_65.loc[df_numeric_65['Fecha'] >= date_63, 'Total Neto'].mean()
+        if pd.isna(monthly_net_63):
+            monthly_net_63 = monthly_net_65 = 0.0
+
+        col1, col2, col3, col4 = st.columns(4)
+
+        with col1:
+            st.metric("Total Neto (63 años)", f"{total_net_63:,.2f} €".replace(',', 'X').replace('.', ',').replace('X', '.'))
+
+        with col2:
+            st.metric(
+                "Total Neto (65 años)",
+                f"{total_net_65:,.2f} €".replace(',', 'X').replace('.', ',').replace('X', '.'),
+                delta=f"{total_net_65 - total_net_63:,.2f} €".replace(',', 'X').replace('.', ',').replace('X', '.'),
+                help="Diferencia respecto a la jubilación a los 63 años"
+            )
+
+        with col3:
+            st.metric("Neto mensual medio desde los 63 (63 años)", f"{monthly_net_63:,.2f} €".replace(',', 'X').replace('.', ',').replace('X', '.'))
+
+        with col4:
+            st.metric(
+                "Neto mensual medio desde los 63 (65 años)",
+                f"{monthly_net_65:,.2f} €".replace(',', 'X').replace('.', ',').replace('X', '.'),
+                delta=f"{monthly_net_65 - monthly_net_63:,.2f} €".replace(',', 'X').replace('.', ',').replace('X', '.'),
+                help="Diferencia respecto a la jubilación a los 63 años"
+            )
+
+        # Gráfico con la evolución de ambos escenarios
+        fig_comparison = build_overlay_figure(
+            (schedule_hash(df_numeric_63), schedule_hash(df_numeric_65)),
+            {
+                "Jubilación a los 63 años": (df_numeric_63['Fecha'].values, df_numeric_63['Total Neto'].values),
+                "Jubilación a los 65 años": (df_numeric_65['Fecha'].values, df_numeric_65['Total Neto'].values)
+            },
+            'Salario Neto Mensual: Jubilación a los 63 vs 65 años',
+            chart_rendering
+        )
+        st.plotly_chart(fig_comparison, width='stretch')
+
+        # Proyección a largo plazo de ambas edades de jubilación en una sola llamada vectorizada
+        if long_horizon:
+            st.markdown(f'<h3 style="color:blue;">Proyección a Largo Plazo (hasta los {horizon_age} años)</h3>', unsafe_allow_html=True)
+            projection, lifetime = project_income_arrays(
+                birth_date, exit_date, annual_salary, fiscal_exemption, irpf_tasa_applied, sepe_salary, irpf_sepe,
+                [retirement_salary, retirement_salary_other], irpf_jubilacion,
+                horizon_age=horizon_age, pension_revaluation=pension_revaluation, discount_rate=discount_rate,
+                pension_start_ages=[63, 65]
+            )
+            selected = 0 if retirement_age == "Jubilación a los 63 años" else 1
+
+            col1, col2, col3, col4 = st.columns(4)
+
+            with col1:
+                st.metric("Total Neto vitalicio", f"{lifetime['Total Neto'][selected]:,.2f} €".replace(',', 'X').replace('.', ',').replace('X', '.'))
+
+            with col2:
+                st.metric("Total Pensión Neta", f"{lifetime['Total Pensión Neta'][selected]:,.2f} €".replace(',', 'X').replace('.', ',').replace('X', '.'))
+
+            with col3:
+                st.metric(
+                    "Valor Actual Neto",
+                    f"{lifetime['Valor Actual Neto'][selected]:,.2f} €".replace(',', 'X').replace('.', ',').replace('X', '.'),
+                    help=f"Total neto descontado al {discount_rate}% anual"
+                )
+
+            with col4:
+                st.metric(
+                    "Valor Actual Neto 65 vs 63",
+                    f"{lifetime['Valor Actual Neto'][1] - lifetime['Valor Actual Neto'][0]:,.2f} €".replace(',', 'X').replace('.', ',').replace('X', '.'),
+                    help="Diferencia del valor actual neto de jubilarse a los 65 respecto a los 63 años"
+                )
+
+            fig_projection = build_overlay_figure(
+                array_hash(projection['Fecha'], projection['Total Neto']),
+                {
+                    scenario: (projection['Fecha'][row][projection['Válido'][row]], projection['Total Neto'][row][projection['Válido'][row]])
+                    for row, scenario in enumerate(["Jubilación a los 63 años", "Jubilación a los 65 años"])
+                },
+                'Salario Neto Mensual Proyectado',
+                chart_rendering
+            )
+            st.plotly_chart(fig_projection, width='stretch')
+
         # st.divider()
 
         # Mostrar resumen
@@ -613,7 +1368,114 @@ def main():
                 else:
                     st.success("✅ Sin limitación")
 
-       
+        # Calculadora inversa: buscar el salario, la fecha de salida o la pensión que alcanza un objetivo
+        with st.expander("🎯 Calculadora inversa (objetivo de ingresos)"):
+            goal_col1, goal_col2, goal_col3 = st.columns(3)
+
+            with goal_col1:
+                goal_metric = st.selectbox(
+                    "Objetivo",
+                    ["Total Neto acumulado", "Neto mensual mínimo"],
+                    key='goal_seek_metric'
+                )
+
+            with goal_col2:
+                goal_variable = st.selectbox(
+                    "Variable a calcular",
+                    ["Salario Anual Bruto", "Fecha de Salida", "Pensión mensual por jubilación"],
+                    key='goal_seek_variable'
+                )
+
+            with goal_col3:
+                goal_target = st.number_input(
+                    "Importe objetivo (€)",
+                    min_value=0.0,
+                    value=float(round(total_net if goal_metric == "Total Neto acumulado" else df_numeric['Total Neto'].min(), 2)),
+                    step=1000.0 if goal_metric == "Total Neto acumulado" else 50.0,
+                    key='goal_seek_target'
+                )
+
+            if st.button("Calcular", key='goal_seek_button'):
+                goal_params = dict(
+                    birth_date=birth_date, employment_start_date=employment_start_date, exit_date=exit_date,
+                    annual_salary=annual_salary, irpf_tasa=irpf_tasa, sepe_salary=sepe_salary, irpf_sepe=irpf_sepe,
+                    retirement_salary_63=retirement_salary_63, retirement_salary_65=retirement_salary_65,
+                    irpf_jubilacion=irpf_jubilacion
+                )
+
+                # Definir la variable y el intervalo de búsqueda
+                if goal_variable == "Salario Anual Bruto":
+                    variable, lower, upper, tolerance = 'annual_salary', 0.0, max(annual_salary * 4, 100000.0), 1.0
+                elif goal_variable == "Fecha de Salida":
+                    variable, tolerance = 'exit_date', 1
+                    lower = max(exit_date - relativedelta(years=10), employment_start_date + relativedelta(months=1))
+                    upper = birth_date + relativedelta(years=63)
+                else:
+                    variable = 'retirement_salary_63' if retirement_age == "Jubilación a los 63 años" else 'retirement_salary_65'
+                    lower, upper, tolerance = 0.0, max(goal_params[variable] * 4, 10000.0), 0.01
+
+                goal_value, goal_achieved, goal_evaluations = goal_seek(
+                    goal_params, variable, goal_target, lower, upper,
+                    metric='total' if goal_metric == "Total Neto acumulado" else 'min_monthly',
+                    tolerance=tolerance
+                )
+
+                if goal_value is None:
+                    st.warning("El objetivo no se alcanza dentro del rango de búsqueda")
+                else:
+                    if variable == 'exit_date':
+                        goal_value_str = goal_value.strftime('%d/%m/%Y')
+                    else:
+                        goal_value_str = f"{goal_value:,.2f} €".replace(',', 'X').replace('.', ',').replace('X', '.')
+                    result_col1, result_col2 = st.columns(2)
+                    with result_col1:
+                        st.metric(goal_variable, goal_value_str, help=f"{goal_evaluations} evaluaciones")
+                    with result_col2:
+                        st.metric(goal_metric, f"{goal_achieved:,.2f} €".replace(',', 'X').replace('.', ',').replace('X', '.'))
+
+        # Análisis de sensibilidad: qué parámetro influye más en el total neto
+        with st.expander("📊 Análisis de sensibilidad"):
+            # Solo se calcula cuando se pide, para no repetirlo en cada cambio de la barra lateral
+            if st.checkbox("Calcular análisis de sensibilidad", key='show_sensitivity'):
+                sensitivity = calculate_sensitivity(
+                    birth_date, employment_start_date, exit_date, annual_salary, irpf_tasa, sepe_salary, irpf_sepe,
+                    retirement_salary if retirement_age == "Jubilación a los 63 años" else retirement_salary_other,
+                    irpf_jubilacion, pension_start_age=63 if retirement_age == "Jubilación a los 63 años" else 65
+                )
+                sensitivity['Etiqueta'] = sensitivity.apply(lambda row: f"{row['Parámetro']} (±{row['Paso']:g} {row['Unidad']})", axis=1)
+                sensitivity['Rango'] = (sensitivity['Total Neto (+paso)'] - sensitivity['Total Neto (-paso)']).abs()
+                sensitivity = sensitivity.sort_values('Rango')
+
+                # Gráfico de tornado con la variación del total neto al bajar y subir cada parámetro
+                df_tornado = sensitivity.melt(
+                    id_vars=['Etiqueta'],
+                    value_vars=['Total Neto (-paso)', 'Total Neto (+paso)'],
+                    var_name='Variación',
+                    value_name='Cambio Total Neto'
+                )
+                fig_tornado = px.bar(
+                    df_tornado,
+                    x='Cambio Total Neto',
+                    y='Etiqueta',
+                    color='Variación',
+                    orientation='h',
+                    barmode='overlay',
+                    title='Sensibilidad del Total Neto',
+                    labels={'Cambio Total Neto': 'Cambio en el Total Neto (€)', 'Etiqueta': 'Parámetro'}
+                )
+                fig_tornado.update_xaxes(tickprefix='€', tickformat=',.0f')
+                fig_tornado.update_layout(plot_bgcolor='white')
+                st.plotly_chart(fig_tornado, width='stretch')
+
+                # Tabla con el cambio por unidad de cada parámetro
+                sensitivity_display = sensitivity.sort_values('Rango', ascending=False)[
+                    ['Parámetro', 'Unidad', 'Total Neto por unidad', 'Exención Fiscal por unidad']
+                ].copy()
+                for col in ['Total Neto por unidad', 'Exención Fiscal por unidad']:
+                    sensitivity_display[col] = sensitivity_display[col].apply(lambda x: f"{x:,.2f} €".replace(',', 'X').replace('.', ',').replace('X', '.'))
+                st.dataframe(sensitivity_display, hide_index=True, width='stretch')
+
+
 
         
         # Mostrar tabla con los datos (excluyendo la última columna)
@@ -640,73 +1502,18 @@ def main():
         else:
             st.dataframe(df_display, height=400, width='stretch')
         
-        # Gráfico de evolución
+        # Gráfico de evolución (cacheado por el hash del calendario)
         st.subheader("Evolución del Salario Neto")
-        # Crear una columna de fecha formateada para el gráfico
-        df_plot = df_numeric.copy()
-        
-        # Asegurarse de que la columna Fecha es de tipo datetime
-        if not pd.api.types.is_datetime64_any_dtype(df_plot['Fecha']):
-            df_plot['Fecha'] = pd.to_datetime(df_plot['Fecha'])
-            
-        # Crear columnas de fecha formateadas
-        df_plot['Fecha_plot'] = df_plot['Fecha'].dt.strftime('%Y-%m')
-        df_plot['Mes'] = df_plot['Fecha'].dt.strftime('%b %Y')  # Formato abreviado mes y año
-        
-        fig = px.line(
-            df_plot,
-            x='Mes', 
-            y='Total Neto',
-            title='Evolución del Salario Neto Mensual',
-            labels={'Total Neto': 'Salario Neto (€)', 'Mes': 'Mes'},
-            range_y=[0, df_numeric['Total Neto'].max() * 1.1]
-        )
-        
-        # Actualizar el formato de los ejes y añadir grid
-        fig.update_layout(
-            xaxis=dict(
-                showgrid=True,
-                gridwidth=1,
-                gridcolor='LightGrey',
-                tickangle=-45,
-                tickmode='auto',
-                nticks=min(len(df_plot), 36),  # Máximo 36 meses para evitar saturación
-                showline=True,
-                linewidth=1,
-                linecolor='black'
-            ),
-            yaxis=dict(
-                showgrid=True,
-                gridwidth=1,
-                gridcolor='LightGrey',
-                tickprefix='€',
-                tickformat=',.2f',
-                showline=True,
-                linewidth=1,
-                linecolor='black',
-                zeroline=True,
-                zerolinewidth=1,
-                zerolinecolor='Grey'
-            ),
-            plot_bgcolor='white',
-            hovermode='x unified'
-        )
-        
+        schedule_key = schedule_hash(df_numeric)
+        fig = build_net_evolution_figure(schedule_key, df_numeric, _render_mode(len(df_numeric), chart_rendering))
         st.plotly_chart(fig, width='stretch')
         
         # Resumen Anual
         st.subheader("Resumen Anual")
         
-        # Crear resumen anual
-        df_anual = df_numeric.copy()
-        # Asegurarse de que la columna Fecha es de tipo datetime
-        if not pd.api.types.is_datetime64_any_dtype(df_anual['Fecha']):
-            df_anual['Fecha'] = pd.to_datetime(df_anual['Fecha'])
-        df_anual['Año'] = df_anual['Fecha'].dt.year
-        
-        # Agrupar por año y sumar las columnas relevantes
+        # Crear resumen anual y su gráfico (cacheados por el hash del calendario)
         columnas_sumar = ['TESA Neto', 'SEPE Neto', 'Pensión Neta', 'Total Neto']
-        resumen_anual = df_anual.groupby('Año')[columnas_sumar].sum().reset_index()
+        resumen_anual, fig_anual = build_annual_summary(schedule_key, df_numeric)
         
         # Formatear los valores para mostrar en la tabla
         resumen_mostrar = resumen_anual.copy()
@@ -731,32 +1538,6 @@ def main():
         # Gráfico de barras del resumen anual
         st.subheader("Distribución Anual")
         
-        # Preparar datos para el gráfico
-        df_anual_plot = resumen_anual.melt(
-            id_vars=['Año'],
-            value_vars=['TESA Neto', 'SEPE Neto', 'Pensión Neta'],
-            var_name='Concepto',
-            value_name='Importe'
-        )
-        
-        # Crear gráfico de barras apiladas
-        fig_anual = px.bar(
-            df_anual_plot,
-            x='Año',
-            y='Importe',
-            color='Concepto',
-            title='Distribución Anual por Concepto',
-            labels={'Año': 'Año', 'Importe': 'Importe (€)', 'Concepto': 'Concepto'},
-            barmode='stack'
-        )
-        
-        # Formatear ejes
-        fig_anual.update_yaxes(
-            tickprefix='€',
-            tickformat=',.2f',
-            title_text='Importe (€)'
-        )
-        
         # Mostrar el gráfico
         st.plotly_chart(fig_anual, width='stretch')
                 
@@ -0,0 +1,120 @@
+"""Equivalence tests between the vectorized and the scalar calculations of streamlit_app.py.
+
+    $ python -m pytest -q
+"""
+import random
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+from dateutil.relativedelta import relativedelta
+
+from streamlit_app import (
+    _salary_schedule, calculate_mixed_compensation, calculate_mixed_compensation_array, project_income_arrays
+)
+
+
+def random_date(rng, start, end):
+    return start + timedelta(days=rng.randint(0, (end - start).days))
+
+
+def end_of_month(day):
+    return day + relativedelta(day=31)
+
+
+def compensation_cases(seed, count):
+    """Seeded (start date, exit date, annual salary) tuples with Python floats"""
+    rng = random.Random(seed)
+    cases = []
+    for index in range(count):
+        start = random_date(rng, date(1975, 1, 1), date(2015, 12, 31))
+        exit_date = random_date(rng, start + timedelta(days=1), date(2035, 12, 31))
+        # Incluir salidas a fin de mes, como las que se eligen en la app
+        if index % 3 == 0:
+            exit_date = end_of_month(exit_date)
+        # Salarios con céntimos y salarios múltiplos de 365 céntimos, cerca de la mitad al redondear
+        salary = round(rng.uniform(5000, 150000), 2) if index % 2 else rng.randint(1, 400000) * 365 / 1000
+        cases.append((start, exit_date, salary))
+    return cases
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_mixed_compensation_array_matches_scalar(seed):
+    cases = compensation_cases(seed, 2000)
+    starts, exits, salaries = (list(column) for column in zip(*cases))
+    total, period1, period2, limitation = calculate_mixed_compensation_array(starts, exits, salaries)
+
+    for row, case in enumerate(cases):
+        expected = calculate_mixed_compensation(*case)
+        assert (total[row], period1[row], period2[row], limitation[row]) == expected, case
+
+
+def test_mixed_compensation_array_halfway_rounding():
+    # 5.475 / 365 * 33 redondea a 0.49 con round(); np.round da 0.5
+    case = (date(2012, 2, 11), date(2013, 2, 10), 5.475)
+    assert calculate_mixed_compensation(*case)[0] == 0.49
+    assert calculate_mixed_compensation_array(*case)[0] == 0.49
+
+
+def test_mixed_compensation_array_end_of_month_exits():
+    start = date(1998, 3, 15)
+    exits = [end_of_month(date(year, month, 1)) for year in (2012, 2020, 2024) for month in range(1, 13)]
+    totals = calculate_mixed_compensation_array(start, exits, 43210.55)[0]
+    assert list(totals) == [calculate_mixed_compensation(start, exit_date, 43210.55)[0] for exit_date in exits]
+
+
+def projection_cases(seed, count):
+    """Seeded arguments of _salary_schedule with a single pension, as Python values"""
+    rng = random.Random(seed)
+    cases = []
+    for index in range(count):
+        # Incluir nacimientos el 29 de febrero y salidas a fin de mes, donde el día se recorta
+        birth_date = date(1964, 2, 29) if index % 10 == 0 else random_date(rng, date(1955, 1, 1), date(1972, 12, 31))
+        exit_date = date(2027, 1, 31) if index % 7 == 0 else random_date(rng, date(2012, 1, 1), date(2031, 12, 31))
+        if index % 3 == 1:
+            exit_date = end_of_month(exit_date)
+        cases.append((
+            birth_date, exit_date, rng.uniform(5000, 120000), rng.uniform(0, 250000), rng.choice([13.75, 30.0]),
+            rng.choice([0.0, 1181.0, 1500.0]), 5.0, round(rng.uniform(0, 4000), 2), 23.0
+        ))
+    return cases
+
+
+@pytest.mark.parametrize('pension_start_age', [63, 65])
+def test_project_income_arrays_matches_salary_schedule(pension_start_age):
+    for case in projection_cases(pension_start_age, 150):
+        birth_date, exit_date, annual_salary, fiscal_exemption, irpf_tasa, sepe_salary, irpf_sepe, retirement_salary, irpf_jubilacion = case
+        # _salary_schedule paga la pensión a los 63 si la hay y, si no, la de los 65 desde los 65
+        pensions = (retirement_salary, 0.0) if pension_start_age == 63 else (0.0, retirement_salary)
+        expected = _salary_schedule(
+            birth_date, exit_date, annual_salary, fiscal_exemption, irpf_tasa, sepe_salary, irpf_sepe, *pensions, irpf_jubilacion
+        )
+        monthly, totals = project_income_arrays(*case, pension_start_ages=pension_start_age)
+
+        months = int(totals['Meses'][0])
+        assert months == len(expected['Fecha']), case
+        assert list(monthly['Fecha'][0, :months].astype(object)) == expected['Fecha'], case
+        for column in ['TESA Bruto', 'Acumulado Tributable', 'IRPF TESA', 'TESA Neto', 'SEPE Neto', 'Pensión Bruta', 'Pensión Neta', 'Total Neto']:
+            assert list(monthly[column][0, :months]) == expected[column], (case, column)
+
+
+def test_project_income_arrays_batch_matches_rows():
+    cases = projection_cases(7, 40)
+    monthly, totals = project_income_arrays(*(list(column) for column in zip(*cases)), pension_start_ages=[63, 65] * 20)
+    for row, case in enumerate(cases):
+        single_monthly, single_totals = project_income_arrays(*case, pension_start_ages=65 if row % 2 else 63)
+        months = single_monthly['Total Neto'].shape[1]
+        assert np.array_equal(monthly['Total Neto'][row, :months], single_monthly['Total Neto'][0])
+        assert totals['Total Neto'][row] == pytest.approx(single_totals['Total Neto'][0])
+
+
+def test_project_income_arrays_pension_start_ages():
+    monthly, _ = project_income_arrays(
+        date(1963, 5, 10), date(2024, 1, 31), 50000.0, 40000.0, 15.0, 1200.0, 10.0, 1500.0, 12.0,
+        horizon_age=70, pension_revaluation=2.0, pension_start_ages=[63, 65]
+    )
+    first_paid = [monthly['Fecha'][row][np.argmax(monthly['Pensión Bruta'][row] > 0)] for row in range(2)]
+    assert first_paid == [np.datetime64('2026-05-28'), np.datetime64('2028-05-28')]
+    # La revalorización empieza en el año en que empieza cada pensión
+    assert monthly['Pensión Bruta'][1][monthly['Fecha'][1] == np.datetime64('2028-12-28')][0] == 1500.0
+    assert monthly['Pensión Bruta'][1][monthly['Fecha'][1] == np.datetime64('2029-01-28')][0] == 1530.0